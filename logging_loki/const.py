@@ -1,15 +1,52 @@
 # -*- coding: utf-8 -*-
 
+import os
 import string
+from typing import Dict
 from typing import Tuple
+from typing import Union
 
 #: Default Loki emitter version.
 emitter_ver: str = "0"
+#: Minimal level (name or number) of log records handled by Loki handlers, set by `LOKI_MIN_LEVEL` env variable.
+min_level: Union[int, str] = os.environ.get("LOKI_MIN_LEVEL", "NOTSET").upper()
+if min_level.isdigit():
+    min_level = int(min_level)
 #: Size of LRU cache for LogQL label formatting.
 format_label_lru_size: int = 256
+#: Number of microseconds in a second, timestamps are precise to microseconds.
+microseconds_per_second: int = 1000000
+
+#: Maximum number of log records in the queue created by default for queue handler.
+queue_size: int = 10000
+#: Maximum number of log records sent to Loki in a single request by queue listener.
+batch_size: int = 100
+#: Maximum time in seconds queue listener waits for a batch of log records to be filled.
+batch_interval: float = 1.0
+#: Maximum time in seconds to wait for background threads to finish when handler is closed.
+close_timeout: float = 10.0
 
 #: Success HTTP status code from Loki API.
 success_response_code: int = 204
+#: HTTP headers sent along with JSON payload.
+json_headers: Dict[str, str] = {"Content-Type": "application/json"}
+#: HTTP headers sent along with compressed payload.
+gzip_headers: Dict[str, str] = {"Content-Encoding": "gzip"}
+#: Minimal size in bytes of payload to be compressed.
+gzip_min_size: int = 1024
+#: Gzip compression level, the lowest one gives most of the ratio on logs for little CPU time.
+gzip_level: int = 1
+#: Timeout in seconds of connecting to Loki and of waiting for its response.
+http_timeout: float = 10.0
+#: Number of HTTP connections kept alive in the pool.
+http_pool_size: int = 10
+#: Number of retries of failed HTTP requests.
+http_retries: int = 3
+#: Backoff factor for delays between retries of failed HTTP requests.
+http_retry_backoff: float = 0.1
+#: HTTP status codes from Loki API that should be retried.
+http_retry_status_codes: Tuple[int, ...] = (502, 503, 504)
+
 
 #: Label name indicating logging level.
 level_tag: str = "severity"
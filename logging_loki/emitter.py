@@ -1,11 +1,10 @@
 # -*- coding: utf-8 -*-
 
 import abc
-import copy
-import functools
+import contextlib
 import logging
-import time
-from logging.config import ConvertingDict
+import threading
+import types
 from typing import Any
 from typing import Dict
 from typing import List
@@ -13,31 +12,50 @@ from typing import Optional
 from typing import Tuple
 
 import requests
-import rfc3339
 
 from logging_loki import const
+from logging_loki import formatters
+from logging_loki import serializer
+from logging_loki import transport
 
 BasicAuth = Optional[Tuple[str, str]]
 
 
-class LokiEmitter(abc.ABC):
+class LokiEmitter(abc.ABC):  # noqa: WPS214
     """Base Loki emitter class."""
 
     success_response_code = const.success_response_code
+    headers = const.json_headers
     level_tag = const.level_tag
     logger_tag = const.logger_tag
     label_allowed_chars = const.label_allowed_chars
     label_replace_with = const.label_replace_with
     session_class = requests.Session
+    # Cached function is exposed as a method without an extra call, subclasses get one built from their chars.
+    format_label = staticmethod(formatters.format_label)  # noqa: WPS421
 
-    def __init__(self, url: str, tags: Optional[dict] = None, auth: BasicAuth = None):
+    def __init_subclass__(cls, **kwargs):
+        """Build label formatter from chars of the subclass unless it defines its own one."""
+        super().__init_subclass__(**kwargs)
+        if "format_label" not in cls.__dict__:
+            label_formatter = formatters.build_label_formatter(cls.label_allowed_chars, tuple(cls.label_replace_with))
+            cls.format_label = staticmethod(label_formatter)  # noqa: WPS421
+
+    def __init__(
+        self,
+        url: str,
+        tags: Optional[dict] = None,
+        auth: BasicAuth = None,
+        compress: bool = False,
+    ):
         """
         Create new Loki emitter.
 
         Arguments:
             url: Endpoint used to send log entries to Loki (e.g. `https://my-loki-instance/loki/api/v1/push`).
-            tags: Default tags added to every log record.
+            tags: Default tags added to every log record, assign `tags` attribute to change them.
             auth: Optional tuple with username and password for basic HTTP authentication.
+            compress: Compress large payloads with gzip.
 
         """
         #: Tags that will be added to all records handled by this handler.
@@ -46,62 +64,149 @@ class LokiEmitter(abc.ABC):
         self.url = url
         #: Optional tuple with username and password for basic authentication.
         self.auth = auth
+        #: Whether payloads larger than `const.gzip_min_size` bytes are compressed with gzip.
+        self.compress = compress
 
         self._session: Optional[requests.Session] = None
+        self._session_lock = threading.Lock()
+        self._local = threading.local()
 
     def __call__(self, record: logging.LogRecord, line: str):
         """Send log record to Loki."""
-        payload = self.build_payload(record, line)
-        resp = self.session.post(self.url, json=payload)
+        self.send(self.build_payload(record, line))
+
+    def emit_batch(self, lines: List[Tuple[logging.LogRecord, str]]):
+        """Send multiple log records along with their formatted lines to Loki in a single request."""
+        self.send(self.build_batch_payload(lines))
+
+    def send(self, payload: dict):
+        """
+        Send JSON payload to Loki.
+
+        Payloads built from records logged while sending (e.g. by `urllib3`) in the same thread are dropped
+        to prevent infinite recursion.
+        """
+        if getattr(self._local, "sending", False):
+            return
+
+        body = serializer.dumps(payload)
+        headers = None
+        if self.compress and len(body) > const.gzip_min_size:
+            body = serializer.compress(body)
+            headers = const.gzip_headers
+
+        session = self.session
+        self._local.sending = True
+        try:  # noqa: WPS501
+            resp = session.post(self.url, data=body, headers=headers, timeout=const.http_timeout)
+        finally:
+            self._local.sending = False
         if resp.status_code != self.success_response_code:
             raise ValueError("Unexpected Loki API response status code: {0}".format(resp.status_code))
 
+    def ping(self):
+        """Open connection to Loki or keep the opened one alive, errors are ignored."""
+        if getattr(self._local, "sending", False):
+            return
+
+        self._local.sending = True
+        with contextlib.suppress(Exception):
+            self.session.head(self.url, timeout=const.http_timeout)
+        self._local.sending = False
+
     @abc.abstractmethod
     def build_payload(self, record: logging.LogRecord, line) -> dict:
         """Build JSON payload with a log entry."""
         raise NotImplementedError  # pragma: no cover
 
+    def build_batch_payload(self, lines: List[Tuple[logging.LogRecord, str]]) -> dict:
+        """Build JSON payload with log entries grouped by streams."""
+        return {"streams": self.build_streams(lines)}
+
+    @abc.abstractmethod
+    def build_streams(self, lines: List[Tuple[logging.LogRecord, str]]) -> List[dict]:
+        """Build Loki streams with log entries grouped by labels."""
+        raise NotImplementedError  # pragma: no cover
+
+    @property
+    def tags(self) -> types.MappingProxyType:
+        """Return read-only tags that will be added to all records handled by this handler."""
+        return types.MappingProxyType(self._tags)
+
+    @tags.setter
+    def tags(self, tags: dict):
+        """Replace default tags with a copy of the given ones and drop tags built for previous ones."""
+        self._tags = dict(tags)
+        intern_tag_name = formatters.intern_tag_name
+        self._base_tags = {intern_tag_name(name): tag_value for name, tag_value in tags.items()}
+        self.clear_cache()
+
+    def clear_cache(self):
+        """Drop tags built for records without extra tags."""
+        self._tags_cache: Dict[Tuple[str, str], Dict[str, Any]] = {}
+
     @property
     def session(self) -> requests.Session:
-        """Create HTTP session."""
+        """Create HTTP session, it is shared by threads sending records and keep-alive thread."""
         if self._session is None:
-            self._session = self.session_class()
-            self._session.auth = self.auth or None
+            with self._session_lock:
+                if self._session is None:
+                    self._session = self.build_session()
         return self._session
 
+    def build_session(self) -> requests.Session:
+        """Create and configure new HTTP session."""
+        session = self.session_class()
+        session.auth = self.auth or None
+        session.headers.update(self.headers)
+        if isinstance(session, requests.Session):
+            adapter = self.build_http_adapter()
+            session.mount("http://", adapter)
+            session.mount("https://", adapter)
+        return session
+
+    def build_http_adapter(self) -> requests.adapters.HTTPAdapter:
+        """Create adapter keeping a pool of connections alive and retrying failed requests."""
+        return transport.build_http_adapter()
+
     def close(self):
         """Close HTTP session."""
         if self._session is not None:
             self._session.close()
             self._session = None
 
-    @functools.lru_cache(const.format_label_lru_size)
-    def format_label(self, label: str) -> str:
+    def build_tags(self, record: logging.LogRecord) -> Dict[str, Any]:
         """
-        Build label to match prometheus format.
+        Return tags that must be send to Loki with a log record.
 
-        `Label format <https://prometheus.io/docs/concepts/data_model/#metric-names-and-labels>`_
+        Tags of records without extra tags are cached and shared, they must not be modified.
         """
-        for char_from, char_to in self.label_replace_with:
-            label = label.replace(char_from, char_to)
-        return "".join(char for char in label if char in self.label_allowed_chars)
-
-    def build_tags(self, record: logging.LogRecord) -> Dict[str, Any]:
-        """Return tags that must be send to Loki with a log record."""
-        tags = dict(self.tags) if isinstance(self.tags, ConvertingDict) else self.tags
-        tags = copy.deepcopy(tags)
-        tags[self.level_tag] = record.levelname.lower()
-        tags[self.logger_tag] = record.name
-
-        extra_tags = getattr(record, "tags", {})
-        if not isinstance(extra_tags, dict):
+        if not hasattr(record, "tags"):
+            key = (record.levelname, record.name)
+            tags = self._tags_cache.get(key)
+            if tags is None:
+                tags = self.build_default_tags(record)
+                self._tags_cache[key] = tags
             return tags
 
+        tags = self.build_default_tags(record)
+        if isinstance(record.tags, dict):
+            self.add_extra_tags(tags, record.tags)
+        return tags
+
+    def add_extra_tags(self, tags: Dict[str, Any], extra_tags: Dict[str, Any]):
+        """Add extra tags of a log record with cleared names, tags with empty names are skipped."""
+        format_label = self.format_label
         for tag_name, tag_value in extra_tags.items():
-            cleared_name = self.format_label(tag_name)
+            cleared_name = format_label(tag_name)
             if cleared_name:
                 tags[cleared_name] = tag_value
 
+    def build_default_tags(self, record: logging.LogRecord) -> Dict[str, Any]:
+        """Return default tags along with record level and logger name."""
+        tags = self._base_tags.copy()
+        tags[self.level_tag] = formatters.format_level(record.levelname)
+        tags[self.logger_tag] = record.name
         return tags
 
 
@@ -111,21 +216,52 @@ class LokiEmitterV0(LokiEmitter):
     def build_payload(self, record: logging.LogRecord, line) -> dict:
         """Build JSON payload with a log entry."""
         labels = self.build_labels(record)
-        ts = rfc3339.format_microsecond(record.created)
+        ts = formatters.format_rfc3339(record.created)
         stream = {
             "labels": labels,
             "entries": [{"ts": ts, "line": line}],
         }
         return {"streams": [stream]}
 
+    def build_streams(self, lines: List[Tuple[logging.LogRecord, str]]) -> List[dict]:
+        """Build Loki streams with log entries grouped by labels."""
+        streams: Dict[str, dict] = {}
+        for record, line in lines:
+            labels = self.build_labels(record)
+            if labels not in streams:
+                streams[labels] = {"labels": labels, "entries": []}
+            entry = {"ts": formatters.format_rfc3339(record.created), "line": line}
+            streams[labels]["entries"].append(entry)
+        return list(streams.values())
+
+    def clear_cache(self):
+        """Drop tags and labels built for records without extra tags."""
+        super().clear_cache()
+        self._labels_cache: Dict[Tuple[str, str], str] = {}
+
     def build_labels(self, record: logging.LogRecord) -> str:
-        """Return Loki labels string."""
+        """Return Loki labels string, labels of records without extra tags are cached."""
+        if hasattr(record, "tags"):
+            return self.format_labels(self.build_tags(record))
+
+        key = (record.levelname, record.name)
+        labels = self._labels_cache.get(key)
+        if labels is None:
+            labels = self.format_labels(self.build_tags(record))
+            self._labels_cache[key] = labels
+        return labels
+
+    def format_labels(self, tags: Dict[str, Any]) -> str:
+        """Return Loki labels string built from tags."""
+        format_label = self.format_label
         labels: List[str] = []
-        for label_name, label_value in self.build_tags(record).items():
-            cleared_name = self.format_label(str(label_name))
-            cleared_value = str(label_value).replace('"', r"\"")
-            labels.append('{0}="{1}"'.format(cleared_name, cleared_value))
-        return "{{{0}}}".format(",".join(labels))
+        for label_name, label_value in tags.items():
+            label_value = str(label_value)
+            if '"' in label_value or "\\" in label_value:
+                label_value = label_value.translate(formatters.label_value_escape_table)
+            cleared_name = format_label(str(label_name))
+            labels.append("".join((cleared_name, '="', label_value, '"')))
+        return "".join(("{", ",".join(labels), "}"))
 
 
 class LokiEmitterV1(LokiEmitter):
@@ -134,10 +270,43 @@ class LokiEmitterV1(LokiEmitter):
     def build_payload(self, record: logging.LogRecord, line) -> dict:
         """Build JSON payload with a log entry."""
         labels = self.build_tags(record)
-        ns = 1e9
-        ts = str(int(time.time() * ns))
         stream = {
             "stream": labels,
-            "values": [[ts, line]],
+            "values": [[self.build_ts(record), line]],
         }
         return {"streams": [stream]}
+
+    def build_streams(self, lines: List[Tuple[logging.LogRecord, str]]) -> List[dict]:  # noqa: WPS210
+        """Build Loki streams with log entries grouped by labels."""
+        streams: Dict[frozenset, dict] = {}
+        # Keys of labels kept in streams, cached tags are shared by records and their key is built once.
+        stream_keys: Dict[int, frozenset] = {}
+        build_tags = self.build_tags
+        build_ts = self.build_ts
+        for record, line in lines:
+            labels = build_tags(record)
+            key = stream_keys.get(id(labels))
+            if key is None:
+                key = self.build_stream_key(labels)
+            stream = streams.get(key)
+            if stream is None:
+                stream = {"stream": labels, "values": []}
+                streams[key] = stream
+                stream_keys[id(labels)] = key
+            stream["values"].append([build_ts(record), line])
+        return list(streams.values())
+
+    def build_stream_key(self, labels: Dict[str, Any]) -> frozenset:
+        """Return hashable key of labels, values are compared the way they are serialized."""
+        return frozenset(zip(labels.keys(), map(str, labels.values())))
+
+    def build_ts(self, record: logging.LogRecord) -> str:
+        """
+        Return record creation time as Unix epoch in nanoseconds.
+
+        Float timestamp is precise to microseconds only, so it is split into integer parts instead
+        of being multiplied by 10^9, which would add float rounding noise to the lowest digits.
+        """
+        seconds, microseconds = formatters.split_timestamp(record.created)
+        fraction = str(microseconds).zfill(6)
+        return "".join((str(seconds), fraction, "000"))
@@ -0,0 +1,120 @@
+# -*- coding: utf-8 -*-
+
+import functools
+import math
+import operator
+import string
+import sys
+from typing import Any
+from typing import Callable
+from typing import Dict
+from typing import Optional
+from typing import Tuple
+
+import rfc3339
+
+from logging_loki import const
+
+LabelFormatter = Callable[[str], str]
+
+
+class LabelTranslateTable(dict):  # noqa: WPS600
+    """
+    `str.translate` table, lazily filled with chars that are removed from label names.
+
+    It is a `dict` subclass, so `str.translate` looks chars up in C and only calls `__missing__` for new ones.
+    """
+
+    def __init__(self, allowed_chars: str, replace_with: Tuple[Tuple[str, str], ...]):
+        """Create translate table from the allowed chars and pairs of chars to replace."""
+        replaced = ((ord(char_from), char_to or None) for char_from, char_to in replace_with)
+        super().__init__(replaced)
+        self.allowed = frozenset(map(ord, allowed_chars))
+        # Label names are mostly made of printable ASCII chars, resolve them upfront.
+        for key in map(ord, string.printable):
+            if key not in self:
+                self.__missing__(key)
+
+    def __missing__(self, key: int) -> Optional[int]:
+        """Keep allowed char and remove any other one."""
+        char = key if key in self.allowed else None
+        self[key] = char
+        return char
+
+
+#: Interned lowercase names of logging levels, filled on first use of a level.
+level_names: Dict[str, str] = {}
+
+
+def format_level(levelname: str) -> str:
+    """Return interned lowercase level name."""
+    level = level_names.get(levelname)
+    if level is None:
+        level = sys.intern(levelname.lower())
+        level_names[levelname] = level
+    return level
+
+
+def intern_tag_name(name: Any) -> Any:
+    """Intern string tag name, so dict lookups can match it by identity."""
+    return sys.intern(name) if type(name) is str else name  # noqa: WPS516
+
+
+#: Table used to escape label values in Loki labels string.
+label_value_escape_table = str.maketrans({'"': r"\"", "\\": r"\\"})
+
+
+@functools.lru_cache(None)
+def build_label_formatter(allowed_chars: str, replace_with: Tuple[Tuple[str, str], ...]) -> LabelFormatter:
+    """
+    Return cached function that builds label to match prometheus format.
+
+    `Label format <https://prometheus.io/docs/concepts/data_model/#metric-names-and-labels>`_
+
+    Functions are shared by emitters with equal allowed chars and chars to replace.
+    """
+    translate = operator.methodcaller("translate", LabelTranslateTable(allowed_chars, replace_with))
+    return functools.lru_cache(const.format_label_lru_size)(translate)
+
+
+#: Function that builds label from allowed chars and chars to replace defined in `const`.
+format_label = build_label_formatter(const.label_allowed_chars, const.label_replace_with)
+
+
+def split_timestamp(timestamp: float) -> Tuple[int, int]:
+    """Split Unix timestamp into whole seconds and microseconds, rounded the same way as `datetime` does."""
+    fraction, seconds = math.modf(timestamp)
+    microseconds = round(fraction * const.microseconds_per_second)
+    if microseconds >= const.microseconds_per_second:
+        return int(seconds) + 1, microseconds - const.microseconds_per_second
+    return int(seconds), microseconds
+
+
+class RFC3339Formatter(object):
+    """Format Unix timestamps as RFC 3339 strings with microseconds, date and time of the last second is reused."""
+
+    #: Length of date and time part of RFC 3339 string without fraction of second and time zone.
+    datetime_length = len("YYYY-MM-DDTHH:MM:SS")
+
+    def __init__(self):
+        """Create new formatter."""
+        self.last: Tuple[int, str, str] = (-1, "", "")
+
+    def __call__(self, timestamp: float) -> str:
+        """Return RFC 3339 string in local time zone, matches `rfc3339.format_microsecond`."""
+        seconds, microseconds = split_timestamp(timestamp)
+        last_seconds, date_time, timezone = self.last
+        if seconds != last_seconds:
+            date_time, timezone = self.split_rfc3339(seconds)
+            self.last = (seconds, date_time, timezone)
+        return "".join((date_time, ".", str(microseconds).zfill(6), timezone))
+
+    def split_rfc3339(self, seconds: int) -> Tuple[str, str]:
+        """Return date and time part of RFC 3339 string without fraction of second and its time zone."""
+        formatted = rfc3339.format(seconds)
+        length = self.datetime_length
+        return formatted[:length], formatted[length:]
+
+
+#: Formatter of timestamps for Loki < 0.4.0.
+format_rfc3339 = RFC3339Formatter()
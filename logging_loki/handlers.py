@@ -1,30 +1,186 @@
 # -*- coding: utf-8 -*-
 
+import contextlib
 import logging
+import threading
+import time
 import warnings
 from logging.handlers import QueueHandler
 from logging.handlers import QueueListener
+from queue import Empty
+from queue import Full
 from queue import Queue
+from typing import Callable
 from typing import Dict
+from typing import List
 from typing import Optional
+from typing import Tuple
 from typing import Type
 
 from logging_loki import const
 from logging_loki import emitter
 
+#: State of the current thread, `sending` is set in threads sending log records to Loki in background.
+background = threading.local()
+
+
+def is_message_only(fmt: Optional[logging.Formatter]) -> bool:
+    """Check whether the formatter outputs nothing but the log message."""
+    if fmt is None:
+        return True
+    percent_style = type(fmt._style) is logging.PercentStyle  # noqa: WPS437,WPS516
+    message_only = percent_style and fmt._fmt == "%(message)s"  # noqa: WPS437
+    return message_only and type(fmt) is logging.Formatter  # noqa: WPS516
+
 
 class LokiQueueHandler(QueueHandler):
     """This handler automatically creates listener and `LokiHandler` to handle logs queue."""
 
-    def __init__(self, queue: Queue, **kwargs):
-        """Create new logger handler with the specified queue and kwargs for the `LokiHandler`."""
-        super().__init__(queue)
-        self.handler = LokiHandler(**kwargs)  # noqa: WPS110
-        self.listener = QueueListener(self.queue, self.handler)
+    def __init__(
+        self,
+        queue: Optional[Queue] = None,
+        batch_size: int = const.batch_size,
+        batch_interval: float = const.batch_interval,
+        drop_callback: Optional[Callable[[logging.LogRecord], None]] = None,
+        **kwargs,
+    ):
+        """
+        Create new logger handler with the specified queue and kwargs for the `LokiHandler`.
+
+        Arguments:
+            queue: Queue used to pass log records to the listener thread, bounded one is created by default.
+            batch_size: Maximum number of log records sent to Loki in a single request.
+            batch_interval: Maximum time in seconds to wait for the batch to be filled.
+            drop_callback: Optional function called with every log record dropped because the queue is full.
+            kwargs: Arguments for the `LokiHandler`.
+
+        """
+        super().__init__(Queue(const.queue_size) if queue is None else queue)
+        self.setLevel(const.min_level)
+        #: Number of log records dropped because the queue is full.
+        self.dropped = 0
+        self.drop_callback = drop_callback
+        self.handler = LokiHandler(**kwargs)
+        self.listener = LokiQueueListener(self.queue, self.handler, batch_size, batch_interval)
         self.listener.start()
 
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        """
+        Prepare log record to be put to the queue.
+
+        Records passed through an in-process queue are formatted by the listener thread, so message arguments
+        must not be mutated after logging. Other queues (e.g. `multiprocessing.Queue`) get pickle-safe records,
+        so do all queues if this handler has its own formatter, which is applied here.
+        """
+        if isinstance(self.queue, Queue) and self.formatter is None:
+            return record
+        return super().prepare(record)
+
+    def handle(self, record: logging.LogRecord):
+        """
+        Handle log record, records logged in background threads sending to Loki (e.g. by `urllib3`) are dropped.
+
+        Otherwise the listener thread would wait for the lock held while `close` waits for that thread.
+        """
+        if getattr(background, "sending", False):
+            return False
+        return super().handle(record)
+
+    def close(self):
+        """Send pending log records, stop the listener and close the handler."""
+        self.listener.stop()
+        self.handler.close()
+        super().close()
+
+    def enqueue(self, record: logging.LogRecord):
+        """Put log record to the queue, record is dropped without blocking if the queue is full."""
+        try:
+            self.queue.put_nowait(record)
+        except Full:
+            self.dropped += 1
+            if self.drop_callback is not None:
+                self.drop_callback(record)
+
+
+class LokiQueueListener(QueueListener):
+    """Queue listener that sends log records to `LokiHandler` in batches."""
+
+    def __init__(
+        self,
+        queue: Queue,
+        handler: "LokiHandler",
+        batch_size: int = const.batch_size,
+        batch_interval: float = const.batch_interval,
+    ):
+        """
+        Create new listener for the specified queue and handler.
+
+        Arguments:
+            queue: Queue to get log records from.
+            handler: Handler used to send log records to Loki.
+            batch_size: Maximum number of log records sent to Loki in a single request.
+            batch_interval: Maximum time in seconds to wait for the batch to be filled.
+
+        """
+        super().__init__(queue, handler)
+        self.handler = handler
+        self.batch_size = batch_size
+        self.batch_interval = batch_interval
+
+    def stop(self):
+        """Send pending log records and stop the listener thread, waits for it at most `const.close_timeout`."""
+        if self._thread is None:
+            return
+        deadline = time.monotonic() + const.close_timeout
+        # Listener thread is left to exit on its own if the queue is not freed in time.
+        with contextlib.suppress(Full):
+            self.enqueue_sentinel()
+        self._thread.join(max(deadline - time.monotonic(), 0))
+        self._thread = None
+
+    def enqueue_sentinel(self):
+        """Put the sentinel to the queue, waits at most `const.close_timeout` for a free slot in a full queue."""
+        self.queue.put(self._sentinel, timeout=const.close_timeout)
+
+    def dequeue_batch(self) -> Tuple[List[logging.LogRecord], bool]:
+        """
+        Wait for a log record and collect following ones until the batch is full or the interval is elapsed.
+
+        Returns collected records and whether the sentinel has been seen.
+        """
+        records: List[logging.LogRecord] = []
+        record = self.dequeue(True)
+        deadline = time.monotonic() + self.batch_interval
+        while record is not self._sentinel:
+            records.append(record)
+            if len(records) >= self.batch_size:
+                return records, False
+            timeout = max(deadline - time.monotonic(), 0)
+            try:
+                record = self.queue.get(True, timeout)
+            except Empty:
+                return records, False
+        return records, True
+
+    def handle_batch(self, records: List[logging.LogRecord]):
+        """Prepare log records and pass them to the handler."""
+        if records:
+            self.handler.handle_batch([self.prepare(record) for record in records])
 
-class LokiHandler(logging.Handler):
+    def _monitor(self):
+        """Send log records to Loki in batches until the sentinel is seen."""
+        background.sending = True
+        has_task_done = hasattr(self.queue, "task_done")
+        stopped = False
+        while not stopped:
+            records, stopped = self.dequeue_batch()
+            self.handle_batch(records)
+            if has_task_done:
+                for _ in range(len(records) + stopped):
+                    self.queue.task_done()
+
+
+class LokiHandler(logging.Handler):  # noqa: WPS214
     """
     Log handler that sends log records to Loki.
 
@@ -36,12 +192,14 @@ class LokiHandler(logging.Handler):
         "1": emitter.LokiEmitterV1,
     }
 
-    def __init__(
+    def __init__(  # noqa: WPS211
         self,
         url: str,
         tags: Optional[dict] = None,
         auth: Optional[emitter.BasicAuth] = None,
         version: Optional[str] = None,
+        compress: bool = False,
+        keepalive_interval: Optional[float] = None,
     ):
         """
         Create new Loki logging handler.
@@ -51,9 +209,15 @@ class LokiHandler(logging.Handler):
             tags: Default tags added to every log record.
             auth: Optional tuple with username and password for basic HTTP authentication.
             version: Version of Loki emitter to use.
+            compress: Compress large payloads with gzip.
+            keepalive_interval: Open connection to Loki in background and keep it alive with requests sent
+                every specified number of seconds.
 
         """
         super().__init__()
+        self.setLevel(const.min_level)
+        #: Last checked formatter and whether it outputs nothing but the log message.
+        self._formatter_check: Tuple[Optional[logging.Formatter], bool] = (None, True)
 
         if version is None and const.emitter_ver == "0":
             msg = (
@@ -67,12 +231,50 @@ class LokiHandler(logging.Handler):
         version = version or const.emitter_ver
         if version not in self.emitters:
             raise ValueError("Unknown emitter version: {0}".format(version))
-        self.emitter = self.emitters[version](url, tags, auth)
+        self.emitter = self.emitters[version](url, tags, auth, compress)
 
-    def handleError(self, record):  # noqa: N802
-        """Close emitter and let default handler take actions on error."""
+        self._keepalive_stopped = threading.Event()
+        self._keepalive_thread: Optional[threading.Thread] = None
+        if keepalive_interval:
+            self._keepalive_thread = threading.Thread(target=self.keep_alive, args=(keepalive_interval,), daemon=True)
+            self._keepalive_thread.start()
+
+    def format(self, record: logging.LogRecord) -> str:  # noqa: A003
+        """Format the record, formatter is bypassed when it would output the log message as is."""
+        checked_formatter, message_only = self._formatter_check
+        if self.formatter is not checked_formatter:
+            message_only = is_message_only(self.formatter)
+            self._formatter_check = (self.formatter, message_only)
+        if message_only and not (record.exc_info or record.exc_text or record.stack_info):
+            return record.getMessage()
+        return super().format(record)
+
+    def handle(self, record: logging.LogRecord):
+        """
+        Handle log record, records logged in background threads sending to Loki (e.g. by `urllib3`) are dropped.
+
+        Otherwise the keep-alive thread would wait for the lock held while `close` waits for that thread.
+        """
+        if getattr(background, "sending", False):
+            return False
+        return super().handle(record)
+
+    def keep_alive(self, interval: float):
+        """Ping Loki every `interval` seconds until the handler is closed."""
+        background.sending = True
+        while True:
+            self.emitter.ping()
+            if self._keepalive_stopped.wait(interval):
+                return
+
+    def close(self):
+        """Stop keep-alive thread and close emitter."""
+        self._keepalive_stopped.set()
+        if self._keepalive_thread is not None:
+            self._keepalive_thread.join(const.close_timeout)
+            self._keepalive_thread = None
         self.emitter.close()
-        super().handleError(record)
+        super().close()
 
     def emit(self, record: logging.LogRecord):
         """Send log record to Loki."""
@@ -81,3 +283,30 @@ class LokiHandler(logging.Handler):
             self.emitter(record, self.format(record))
         except Exception:
             self.handleError(record)
+
+    def handle_batch(self, records: List[logging.LogRecord]):
+        """Send log records passing handler filters to Loki with the I/O lock held."""
+        records = [record for record in records if self.filter(record)]
+        if not records:
+            return
+
+        with self.lock:
+            self.emit_batch(records)
+
+    def emit_batch(self, records: List[logging.LogRecord]):
+        """Send multiple log records to Loki at once, records failed to be formatted are reported and skipped."""
+        lines: List[Tuple[logging.LogRecord, str]] = []
+        for record in records:
+            # noinspection PyBroadException
+            try:
+                lines.append((record, self.format(record)))
+            except Exception:
+                self.handleError(record)
+        if not lines:
+            return
+
+        # noinspection PyBroadException
+        try:
+            self.emitter.emit_batch(lines)
+        except Exception:
+            self.handleError(lines[0][0])
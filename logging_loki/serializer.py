@@ -0,0 +1,26 @@
+# -*- coding: utf-8 -*-
+
+import contextlib
+import gzip
+import json
+
+from logging_loki import const
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover
+    orjson = None
+
+
+def dumps(payload: dict) -> bytes:
+    """Serialize payload to JSON using `orjson` if it is installed, falls back to `json` on unsupported data."""
+    if orjson is not None:
+        # E.g. lone surrogates are not supported by `orjson`, but escaped by `json`.
+        with contextlib.suppress(orjson.JSONEncodeError):
+            return orjson.dumps(payload)
+    return json.dumps(payload, allow_nan=False, separators=(",", ":")).encode("ascii")
+
+
+def compress(body: bytes) -> bytes:
+    """Compress serialized payload with gzip."""
+    return gzip.compress(body, compresslevel=const.gzip_level)
@@ -0,0 +1,18 @@
+# -*- coding: utf-8 -*-
+
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+from logging_loki import const
+
+
+def build_http_adapter() -> HTTPAdapter:
+    """Create adapter keeping a pool of connections alive and retrying failed requests."""
+    retry = Retry(
+        total=const.http_retries,
+        backoff_factor=const.http_retry_backoff,
+        status_forcelist=const.http_retry_status_codes,
+        allowed_methods=None,
+        raise_on_status=False,
+    )
+    return HTTPAdapter(pool_connections=const.http_pool_size, pool_maxsize=const.http_pool_size, max_retries=retry)
@@ -17,7 +17,8 @@ setuptools.setup(
     url="https://github.com/greyzmeem/python-logging-loki",
     packages=setuptools.find_packages(exclude=("tests",)),
     python_requires=">=3.6",
-    install_requires=["rfc3339>=6.1", "requests"],
+    install_requires=["rfc3339>=6.1", "requests", "urllib3>=1.26"],
+    extras_require={"orjson": ["orjson"]},
     classifiers=[
         "Development Status :: 4 - Beta",
         "Intended Audience :: Developers",
@@ -1,9 +1,13 @@
 # -*- coding: utf-8 -*-
 
+import gzip
+import json
 import logging
+import string
 import time
 from logging.config import dictConfig as loggingDictConfig
 from queue import Queue
+from typing import List
 from typing import Tuple
 from unittest.mock import MagicMock
 
@@ -12,6 +16,7 @@ import rfc3339
 from freezegun import freeze_time
 
 from logging_loki.emitter import LokiEmitterV0
+from logging_loki.formatters import RFC3339Formatter
 
 emitter_url: str = "https://example.net/api/prom/push"
 record_kwargs = {
@@ -25,6 +30,13 @@ record_kwargs = {
 }
 
 
+class LowercaseEmitterV0(LokiEmitterV0):
+    """Emitter allowing lowercase label names only."""
+
+    label_allowed_chars = string.ascii_lowercase
+    label_replace_with = (("-", ""),)
+
+
 @pytest.fixture()
 def emitter_v0() -> Tuple[LokiEmitterV0, MagicMock]:
     """Create v1 emitter with mocked http session."""
@@ -45,11 +57,23 @@ def create_record(**kwargs) -> logging.LogRecord:
     return log.makeRecord(**{**record_kwargs, **kwargs})
 
 
+def get_streams(session: MagicMock) -> list:
+    """Return stream items from json payload."""
+    kwargs = session().post.call_args[1]
+    body = kwargs["data"]
+    if kwargs["headers"]:
+        body = gzip.decompress(body)
+    return json.loads(body)["streams"]
+
+
 def get_stream(session: MagicMock) -> dict:
     """Return first stream item from json payload."""
-    kwargs = session().post.call_args[1]
-    streams = kwargs["json"]["streams"]
-    return streams[0]
+    return get_streams(session)[0]
+
+
+def get_lines(stream: dict) -> List[str]:
+    """Return log lines of stream entries."""
+    return [entry["line"] for entry in stream["entries"]]
 
 
 def test_record_sent_to_emitter_url(emitter_v0):
@@ -77,6 +101,16 @@ def test_default_tags_added_to_payload(emitter_v0):
     assert stream["labels"] == expected
 
 
+def test_default_tags_updated_after_change(emitter_v0):
+    emitter, session = emitter_v0
+    emitter(create_record(), "")
+    emitter.tags = {"app": "changed"}
+    emitter(create_record(), "")
+
+    stream = get_stream(session)
+    assert 'app="changed"' in stream["labels"]
+
+
 def test_extra_tag_added(emitter_v0):
     emitter, session = emitter_v0
     record = create_record(extra={"tags": {"extra_tag": "extra_value"}})
@@ -107,6 +141,29 @@ def test_label_properly_formatted(emitter_v0, label: str):
     assert ',test_svc="extra_value"' in stream["labels"]
 
 
+def test_label_formatted_with_chars_of_subclass():
+    assert LowercaseEmitterV0.format_label("Test-svc.1") == "estsvc"
+    assert LokiEmitterV0.format_label("Test-svc.1") == "Test_svc_1"
+
+
+def test_quotes_escaped_in_label_value(emitter_v0):
+    emitter, session = emitter_v0
+    record = create_record(extra={"tags": {"extra_tag": 'extra "value"'}})
+    emitter(record, "")
+
+    stream = get_stream(session)
+    assert r'extra_tag="extra \"value\""' in stream["labels"]
+
+
+def test_backslashes_escaped_in_label_value(emitter_v0):
+    emitter, session = emitter_v0
+    record = create_record(extra={"tags": {"extra_tag": "extra\\"}})
+    emitter(record, "")
+
+    stream = get_stream(session)
+    assert r'extra_tag="extra\\"' in stream["labels"]
+
+
 def test_empty_label_is_not_added_to_stream(emitter_v0):
     emitter, session = emitter_v0
     record = create_record(extra={"tags": {"!": "extra_value"}})
@@ -152,6 +209,14 @@ def test_timestamp_added_to_values(emitter_v0):
     assert stream["entries"][0]["ts"] == expected
 
 
+@pytest.mark.parametrize("timestamp", (1572827108.123456, 1572827108.1234567, 1572827108.9999999, 1572827109))
+def test_timestamp_formatted_as_rfc3339(timestamp: float):
+    formatter = RFC3339Formatter()
+    formatter(timestamp - 1)
+    assert formatter(timestamp) == rfc3339.format_microsecond(timestamp)
+    assert formatter(timestamp) == rfc3339.format_microsecond(timestamp)
+
+
 def test_session_is_closed(emitter_v0):
     emitter, session = emitter_v0
     emitter(create_record(), "")
@@ -181,3 +246,17 @@ def test_can_build_tags_from_converting_dict(emitter_v0):
     logger = logging.getLogger(logger_name)
     emitter: LokiEmitterV0 = logger.handlers[0].handler.emitter
     emitter.build_tags(create_record())
+
+
+def test_batch_records_grouped_by_stream(emitter_v0):
+    emitter, session = emitter_v0
+    lines = [
+        (create_record(), "First"),
+        (create_record(extra={"tags": {"extra_tag": "extra_value"}}), "Second"),
+        (create_record(), "Third"),
+    ]
+    emitter.emit_batch(lines)
+
+    session().post.assert_called_once()
+    streams = get_streams(session)
+    assert [get_lines(stream) for stream in streams] == [["First", "Third"], ["Second"]]
@@ -1,14 +1,18 @@
 # -*- coding: utf-8 -*-
 
+import gzip
+import json
 import logging
 from logging.config import dictConfig as loggingDictConfig
 from queue import Queue
+from typing import List
 from typing import Tuple
 from unittest.mock import MagicMock
 
 import pytest
 from freezegun import freeze_time
 
+from logging_loki import const
 from logging_loki.emitter import LokiEmitterV1
 
 emitter_url: str = "https://example.net/loki/api/v1/push/"
@@ -43,11 +47,23 @@ def create_record(**kwargs) -> logging.LogRecord:
     return log.makeRecord(**{**record_kwargs, **kwargs})
 
 
+def get_streams(session: MagicMock) -> list:
+    """Return stream items from json payload."""
+    kwargs = session().post.call_args[1]
+    body = kwargs["data"]
+    if kwargs["headers"]:
+        body = gzip.decompress(body)
+    return json.loads(body)["streams"]
+
+
 def get_stream(session: MagicMock) -> dict:
     """Return first stream item from json payload."""
-    kwargs = session().post.call_args[1]
-    streams = kwargs["json"]["streams"]
-    return streams[0]
+    return get_streams(session)[0]
+
+
+def get_lines(stream: dict) -> List[str]:
+    """Return log lines of stream entries."""
+    return [stream_value[1] for stream_value in stream["values"]]
 
 
 def test_record_sent_to_emitter_url(emitter_v1):
@@ -73,6 +89,24 @@ def test_default_tags_added_to_payload(emitter_v1):
     assert stream["stream"] == expected
 
 
+def test_default_tags_updated_after_change(emitter_v1):
+    emitter, session = emitter_v1
+    emitter(create_record(), "")
+    emitter.tags = {"app": "changed"}
+    emitter(create_record(), "")
+
+    stream = get_stream(session)
+    assert stream["stream"]["app"] == "changed"
+
+
+def test_default_tags_cannot_be_mutated_in_place(emitter_v1):
+    emitter, _ = emitter_v1
+    emitter.tags = {"app": "emitter"}
+
+    with pytest.raises(TypeError):
+        emitter.tags["app"] = "changed"  # type: ignore
+
+
 def test_extra_tag_added(emitter_v1):
     emitter, session = emitter_v1
     record = create_record(extra={"tags": {"extra_tag": "extra_value"}})
@@ -129,6 +163,20 @@ def test_raises_value_error_on_non_successful_response(emitter_v1):
         pytest.fail("Must raise ValueError on non-successful Loki response")  # pragma: no cover
 
 
+def test_records_logged_while_sending_are_dropped(emitter_v1):
+    emitter, session = emitter_v1
+    response = session().post.return_value
+
+    def post(*args, **kwargs):  # noqa: WPS430
+        emitter(create_record(), "Recursive")
+        return response
+
+    session().post.side_effect = post
+    emitter(create_record(), "")
+
+    session().post.assert_called_once()
+
+
 def test_logged_messaged_added_to_values(emitter_v1):
     emitter, session = emitter_v1
     emitter(create_record(), "Test message")
@@ -147,6 +195,35 @@ def test_timestamp_added_to_values(emitter_v1):
     assert stream["values"][0][0] == str(expected)
 
 
+def test_timestamp_is_record_creation_time(emitter_v1):
+    emitter, session = emitter_v1
+    with freeze_time("2019-11-04 00:25:08.123456"):
+        record = create_record()
+    with freeze_time("2019-11-04 00:25:09"):
+        emitter(record, "")
+
+    stream = get_stream(session)
+    expected = 1572827108123456000
+    assert stream["values"][0][0] == str(expected)
+
+
+def test_session_retries_failed_requests():
+    emitter = LokiEmitterV1(url=emitter_url)
+    adapter = emitter.session.get_adapter(emitter_url)
+    assert adapter.max_retries.total == const.http_retries
+    assert emitter.session.headers["Content-Type"] == "application/json"
+    emitter.close()
+
+
+@freeze_time("2026-10-15 12:00:00.943271")
+def test_timestamp_has_no_float_rounding_noise(emitter_v1):
+    emitter, session = emitter_v1
+    emitter(create_record(), "")
+
+    stream = get_stream(session)
+    assert stream["values"][0][0].endswith("943271000")
+
+
 def test_session_is_closed(emitter_v1):
     emitter, session = emitter_v1
     emitter(create_record(), "")
@@ -176,3 +253,80 @@ def test_can_build_tags_from_converting_dict(emitter_v1):
     logger = logging.getLogger(logger_name)
     emitter: LokiEmitterV1 = logger.handlers[0].handler.emitter
     emitter.build_tags(create_record())
+
+
+def test_batch_records_sent_in_single_request(emitter_v1):
+    emitter, session = emitter_v1
+    emitter.emit_batch([(create_record(), "First"), (create_record(), "Second")])
+
+    session().post.assert_called_once()
+    stream = get_stream(session)
+    assert get_lines(stream) == ["First", "Second"]
+
+
+def test_batch_records_grouped_by_stream(emitter_v1):
+    emitter, session = emitter_v1
+    lines = [
+        (create_record(), "First"),
+        (create_record(extra={"tags": {"extra_tag": "extra_value"}}), "Second"),
+        (create_record(), "Third"),
+    ]
+    emitter.emit_batch(lines)
+
+    streams = get_streams(session)
+    assert [get_lines(stream) for stream in streams] == [["First", "Third"], ["Second"]]
+
+
+def test_batch_records_with_equal_extra_tags_grouped(emitter_v1):
+    emitter, session = emitter_v1
+    lines = [
+        (create_record(extra={"tags": {"extra_tag": "first"}}), "First"),
+        (create_record(extra={"tags": {"extra_tag": "first"}}), "Second"),
+        (create_record(extra={"tags": {"extra_tag": "second"}}), "Third"),
+        (create_record(), "Fourth"),
+        (create_record(), "Fifth"),
+    ]
+    emitter.emit_batch(lines)
+
+    streams = get_streams(session)
+    expected = [["First", "Second"], ["Third"], ["Fourth", "Fifth"]]
+    assert [get_lines(stream) for stream in streams] == expected
+
+
+def test_large_payload_compressed(emitter_v1):
+    emitter, session = emitter_v1
+    emitter.compress = True
+    line = "x" * const.gzip_min_size
+    emitter(create_record(), line)
+
+    assert session().post.call_args[1]["headers"] == const.gzip_headers
+    stream = get_stream(session)
+    assert stream["values"][0][1] == line
+
+
+def test_small_payload_not_compressed(emitter_v1):
+    emitter, session = emitter_v1
+    emitter.compress = True
+    emitter(create_record(), "")
+
+    assert session().post.call_args[1]["headers"] is None
+
+
+@pytest.mark.parametrize("without_orjson", (False, True))
+def test_lone_surrogate_serialized(emitter_v1, monkeypatch, without_orjson: bool):
+    emitter, session = emitter_v1
+    if without_orjson:
+        monkeypatch.setattr("logging_loki.serializer.orjson", None)
+    emitter(create_record(), "x\udc80")
+
+    stream = get_stream(session)
+    assert stream["values"][0][1] == "x\udc80"
+
+
+def test_payload_serialized_without_orjson(emitter_v1, monkeypatch):
+    emitter, session = emitter_v1
+    monkeypatch.setattr("logging_loki.serializer.orjson", None)
+    emitter(create_record(), "Test message")
+
+    stream = get_stream(session)
+    assert stream["values"][0][1] == "Test message"
@@ -0,0 +1,244 @@
+# -*- coding: utf-8 -*-
+
+import json
+import logging
+import subprocess  # noqa: S404
+import sys
+import threading
+import time
+from pathlib import Path
+from queue import Queue
+from unittest.mock import MagicMock
+from unittest.mock import patch
+
+import pytest
+
+from logging_loki import const
+from logging_loki.emitter import LokiEmitterV1
+from logging_loki.handlers import LokiHandler
+from logging_loki.handlers import LokiQueueHandler
+
+handler_url: str = "https://example.net/loki/api/v1/push/"
+unreachable_url: str = "http://127.0.0.1:9/loki/api/v1/push"
+
+
+@pytest.fixture()
+def loki_handler() -> LokiHandler:
+    """Create handler for v1 emitter."""
+    return LokiHandler(url=handler_url, version="1")
+
+
+@pytest.fixture()
+def queue_handler() -> LokiQueueHandler:
+    """Create queue handler with mocked http session and long batch interval."""
+    response = MagicMock()
+    response.status_code = const.success_response_code
+    session = MagicMock()
+    session().post = MagicMock(return_value=response)
+
+    queue: Queue = Queue(-1)
+    instance = LokiQueueHandler(queue, batch_size=3, batch_interval=60, url=handler_url, version="1")
+    instance.handler.emitter.session_class = session
+    return instance
+
+
+def get_batches(queue_handler: LokiQueueHandler) -> list:
+    """Return lines of log records sent in every request."""
+    post = queue_handler.handler.emitter.session_class().post
+    batches = []
+    for call in post.call_args_list:
+        streams = json.loads(call[1]["data"])["streams"]
+        batches.append([line for stream in streams for _, line in stream["values"]])
+    return batches
+
+
+def create_record(**kwargs) -> logging.LogRecord:
+    """Create test logging record."""
+    log = logging.Logger(__name__)
+    record_kwargs = {
+        "name": "test",
+        "level": logging.WARNING,
+        "fn": "",
+        "lno": "",
+        "msg": "Test %s",
+        "args": ("message",),
+        "exc_info": None,
+    }
+    return log.makeRecord(**{**record_kwargs, **kwargs})
+
+
+@pytest.mark.parametrize(
+    "fmt",
+    (
+        None,
+        logging.Formatter("%(message)s"),
+        logging.Formatter("%(levelname)s %(message)s"),
+        logging.Formatter("{message}", style="{"),
+    ),
+)
+def test_format_matches_formatter_output(loki_handler, fmt):
+    loki_handler.setFormatter(fmt)
+    expected = (fmt or logging.Formatter()).format(create_record())
+    assert loki_handler.format(create_record()) == expected
+
+
+def test_format_uses_assigned_formatter(loki_handler):
+    assert loki_handler.format(create_record()) == "Test message"
+    loki_handler.formatter = logging.Formatter("%(levelname)s | %(message)s")
+    assert loki_handler.format(create_record()) == "WARNING | Test message"
+
+
+def test_format_includes_exception(loki_handler):
+    record = create_record(exc_info=(ValueError, ValueError("Test error"), None))
+
+    line = loki_handler.format(record)
+    assert line == "Test message\nValueError: Test error"
+
+
+def test_min_level_set_on_handler(monkeypatch):
+    monkeypatch.setattr(const, "min_level", "ERROR")
+    loki_handler = LokiHandler(url=handler_url, version="1")
+    assert loki_handler.level == logging.ERROR
+
+
+def test_queued_records_sent_in_batches(queue_handler):
+    for index in range(4):
+        queue_handler.handle(create_record(args=(index,)))
+    queue_handler.listener.stop()
+
+    assert get_batches(queue_handler) == [["Test 0", "Test 1", "Test 2"], ["Test 3"]]
+
+
+def test_filtered_records_not_sent_in_batch(queue_handler):
+    queue_handler.handler.addFilter(lambda record: record.getMessage() != "Test 1")
+    for index in range(3):
+        queue_handler.handle(create_record(args=(index,)))
+    queue_handler.listener.stop()
+
+    assert get_batches(queue_handler) == [["Test 0", "Test 2"]]
+
+
+def test_record_formatted_by_listener(queue_handler):
+    record = create_record()
+    assert queue_handler.prepare(record) is record
+
+    queue_handler.handle(record)
+    queue_handler.listener.stop()
+    assert get_batches(queue_handler) == [["Test message"]]
+
+
+def test_records_dropped_when_queue_is_full():
+    dropped = []
+    queue_handler = LokiQueueHandler(Queue(1), drop_callback=dropped.append, url=handler_url, version="1")
+    queue_handler.listener.stop()
+    for index in range(2):
+        queue_handler.handle(create_record(args=(index,)))
+
+    assert queue_handler.dropped == 1
+    assert [record.getMessage() for record in dropped] == ["Test 1"]
+
+
+def test_keepalive_pings_loki_until_closed():
+    session = MagicMock()
+    pinged = threading.Event()
+    session().head.side_effect = lambda url, **kwargs: pinged.set()
+    with patch.object(LokiEmitterV1, "session_class", session):
+        loki_handler = LokiHandler(url=handler_url, version="1", keepalive_interval=60)
+        assert pinged.wait(1)
+        loki_handler.close()
+
+    session().head.assert_called_once_with(handler_url, timeout=const.http_timeout)
+    assert not loki_handler._keepalive_thread  # noqa: WPS437
+
+
+def test_session_kept_open_on_error(loki_handler, monkeypatch):
+    session = MagicMock()
+    session().post().status_code = None
+    loki_handler.emitter.session_class = session
+    monkeypatch.setattr(logging, "raiseExceptions", False)
+    loki_handler.handle(create_record())
+
+    session().close.assert_not_called()
+
+
+def test_record_failed_to_format_skipped_in_batch(queue_handler, monkeypatch):
+    reported = []
+    monkeypatch.setattr(queue_handler.handler, "handleError", reported.append)
+    queue_handler.handle(create_record(msg="good 1", args=None))
+    queue_handler.handle(create_record(msg="bad %d", args=("x",)))
+    queue_handler.handle(create_record(msg="good 2", args=None))
+    queue_handler.listener.stop()
+
+    assert get_batches(queue_handler) == [["good 1", "good 2"]]
+    assert [record.msg for record in reported] == ["bad %d"]
+
+
+def test_pending_records_sent_on_close(queue_handler):
+    queue_handler.handle(create_record())
+    queue_handler.close()
+
+    assert get_batches(queue_handler) == [["Test message"]]
+    queue_handler.close()
+
+
+def test_single_session_created_by_concurrent_threads(loki_handler):
+    session_delay = 0.05
+    session_class = MagicMock(side_effect=lambda: time.sleep(session_delay) or MagicMock())
+    loki_handler.emitter.session_class = session_class
+    session_args = (loki_handler.emitter, "session")
+    threads = [threading.Thread(target=getattr, args=session_args) for _ in range(2)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert session_class.call_count == 1
+
+
+def test_queue_handler_formatter_applied(queue_handler):
+    queue_handler.setFormatter(logging.Formatter("%(levelname)s | %(message)s"))
+    queue_handler.handle(create_record())
+    queue_handler.listener.stop()
+
+    assert get_batches(queue_handler) == [["WARNING | Test message"]]
+
+
+def test_full_queue_sent_on_close():
+    post_delay = 0.05
+    response = MagicMock(status_code=const.success_response_code)
+    slow_session = MagicMock()
+    slow_session().post.side_effect = lambda *args, **kwargs: time.sleep(post_delay) or response
+    queue: Queue = Queue(1)
+    queue_handler = LokiQueueHandler(queue, batch_size=1, url=handler_url, version="1")
+    queue_handler.handler.emitter.session_class = slow_session
+    for index in range(3):
+        queue_handler.handle(create_record(args=(index,)))
+    queue_handler.close()
+
+    sent = sum(len(batch) for batch in get_batches(queue_handler))
+    assert sent + queue_handler.dropped == 3
+    assert queue.empty()
+
+
+@pytest.mark.parametrize(
+    "handler_call",
+    (
+        "LokiQueueHandler(url={0!r}, version='1')",
+        "LokiHandler(url={0!r}, version='1', keepalive_interval=30)",
+    ),
+)
+def test_shutdown_with_unreachable_loki_not_hanging(handler_call: str):
+    script = "; ".join(
+        (
+            "import logging, time",
+            "from logging_loki import LokiHandler, LokiQueueHandler",
+            "logging.getLogger().addHandler({0})".format(handler_call.format(unreachable_url)),
+            "logging.getLogger('test').warning('Test message')",
+            "time.sleep(0.3)",
+            "logging.shutdown()",
+        ),
+    )
+    root = Path(__file__).parent.parent
+    args = [sys.executable, "-c", script]
+    process = subprocess.run(args, cwd=root, stderr=subprocess.PIPE, timeout=60)  # noqa: S603
+    assert process.returncode == 0